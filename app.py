@@ -1,36 +1,58 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from yt_dlp import YoutubeDL
-from io import BytesIO
 import asyncio
+import os
+import re
+import shutil
+import tempfile
 
 app = FastAPI()
 
-async def download_to_memory(url):
-    buffer = BytesIO()
+# Runs of anything that isn't a word character or dash collapse to one underscore
+UNSAFE_CHARS = re.compile(r'[^\w\-]+')
+
+async def download_to_file(url):
+    """Download the video to a temp dir and return (file path, title)."""
+    temp_dir = tempfile.mkdtemp()
     ydl_opts = {
         'format': 'best',
-        'outtmpl': '-',
-        'logtostderr': True,
+        'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
     }
-    
-    with YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-        title = info['title']
-        # Stream to memory instead of disk
-        ydl.download([url])
-        
-    buffer.seek(0)
-    return buffer, title
+
+    def fetch():
+        with YoutubeDL(ydl_opts) as ydl:
+            # Extract metadata and download in a single call
+            info = ydl.extract_info(url, download=True)
+            return info['title']
+
+    try:
+        # Run the blocking yt-dlp work off the event loop
+        title = await asyncio.to_thread(fetch)
+        files = os.listdir(temp_dir)
+        if not files:
+            raise Exception("Download failed: No file created")
+        return os.path.join(temp_dir, files[0]), title
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
 
 @app.post("/api/download")
 async def download_video(url: str):
     try:
-        buffer, title = await download_to_memory(url)
-        return StreamingResponse(
-            buffer,
-            media_type="video/mp4",
-            headers={"Content-Disposition": f'attachment; filename="{title}.mp4"'}
-        )
+        file_path, title = await download_to_file(url)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Capped at 200 UTF-8 bytes (cut on a codepoint boundary) so the
+    # name stays under the kernel's 255-byte filename limit
+    safe_title = UNSAFE_CHARS.sub('_', title).encode('utf-8')[:200] \
+        .decode('utf-8', 'ignore').strip('_') or 'video'
+    cleanup = BackgroundTask(shutil.rmtree, os.path.dirname(file_path), ignore_errors=True)
+    return FileResponse(
+        file_path,
+        media_type="video/mp4",
+        filename=f"{safe_title}.mp4",
+        background=cleanup
+    )
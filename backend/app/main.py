@@ -1,12 +1,22 @@
 # backend/app/main.py
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
+import json
 from yt_dlp import YoutubeDL
+from diskcache import Cache
+from aiolimiter import AsyncLimiter
+from urllib.parse import urlparse, parse_qs, quote
+import asyncio
+import httpx
+import time
 import os
+import re
 import tempfile
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
 # Define base models first
@@ -23,10 +33,145 @@ class VideoFormat(BaseModel):
     has_video: bool
     has_audio: bool
     quality: str = ""
+    sort_height: int = 0
 
 # Initialize FastAPI
 app = FastAPI()
 
+# yt-dlp calls are blocking, so run them on a thread pool to keep the
+# event loop free for other requests
+executor = ThreadPoolExecutor(max_workers=8)
+
+# On-disk metadata cache so repeated /formats calls for the same URL
+# skip the extractor (and YouTube) entirely
+cache = Cache('.cache')
+
+# Only the fields the API uses survive caching; the raw info dict is
+# huge and full of non-picklable objects
+INFO_FIELDS = ('title', 'duration')
+FORMAT_FIELDS = ('format_id', 'ext', 'resolution', 'height', 'width',
+                 'filesize', 'format_note', 'fps', 'vcodec', 'acodec')
+
+YTDLP_BIN = shutil.which('yt-dlp') or 'yt-dlp'
+
+async def extract_video_info(url):
+    """Extract metadata via the yt-dlp CLI and return a slimmed-down info dict.
+
+    Runs yt-dlp as a subprocess instead of the in-process API: signature
+    deciphering is CPU-bound and holds the GIL, so separate processes let
+    concurrent extractions actually use multiple cores. Results are cached
+    on disk for a day.
+    """
+    cached = cache.get(('video_info', url))
+    if cached is not None:
+        return cached
+
+    # Rate-limit only the actual upstream call — cache hits stay free
+    async with get_host_limiter(url):
+        proc = await asyncio.create_subprocess_exec(
+            YTDLP_BIN, '-J', '--no-playlist', '--skip-download',
+            '--quiet', '--no-progress', '--no-warnings', '--no-check-certificates',
+            '--cache-dir', os.path.expanduser('~/.cache/yt-dlp'),
+            '--user-agent', HTTP_HEADERS['User-Agent'],
+            '--extractor-args', 'youtube:player_skip=configs;skip=translated_subs',
+            url,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise Exception(f"yt-dlp failed: {stderr.decode(errors='replace').strip()}")
+
+    info = json.loads(stdout)
+    _cache_format_urls(url, info.get('formats', []))
+    slim = {k: info[k] for k in INFO_FIELDS if info.get(k) is not None}
+    slim['formats'] = [{k: f[k] for k in FORMAT_FIELDS if f.get(k) is not None}
+                       for f in info.get('formats', [])]
+    cache.set(('video_info', url), slim, expire=86400)
+    return slim
+
+def _direct_url_ttl(direct_url):
+    """TTL for a resolved CDN URL, from its own expire query param."""
+    expire = parse_qs(urlparse(direct_url).query).get('expire', [None])[0]
+    try:
+        # Keep a minute of safety margin before the URL actually lapses
+        return int(expire) - time.time() - 60
+    except (TypeError, ValueError):
+        return 300
+
+def _cache_format_urls(page_url, formats):
+    """Remember each format's resolved direct URL so an immediate
+    /download can proxy it without re-running the extractor."""
+    for f in formats:
+        direct = f.get('url')
+        if not direct or not f.get('format_id'):
+            continue
+        ttl = _direct_url_ttl(direct)
+        if ttl > 0:
+            cache.set(('format_url', page_url, f['format_id']),
+                      {'url': direct, 'ext': f.get('ext')}, expire=ttl)
+
+async def proxy_direct_url(page_url, cached):
+    """Stream a cached CDN URL straight to the client, or None to fall back."""
+    client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=None), follow_redirects=True)
+    try:
+        request = client.build_request('GET', cached['url'], headers=HTTP_HEADERS)
+        response = await client.send(request, stream=True)
+        if response.status_code != 200:
+            await response.aclose()
+            await client.aclose()
+            return None
+    except Exception as e:
+        print(f"Direct URL proxy failed, falling back to yt-dlp: {e}")
+        await client.aclose()
+        return None
+
+    info = cache.get(('video_info', page_url)) or {}
+    safe_title = sanitize_title(info.get('title', 'video'))
+    filename = f"{safe_title}.{cached.get('ext') or 'mp4'}"
+    # Headers are latin-1; non-ASCII titles need the RFC 5987 filename*
+    # form (same logic FileResponse applies on the temp-file path)
+    quoted = quote(filename)
+    if quoted == filename:
+        disposition = f'attachment; filename="{filename}"'
+    else:
+        disposition = f"attachment; filename*=utf-8''{quoted}"
+    headers = {'Content-Disposition': disposition}
+    if response.headers.get('Content-Length'):
+        headers['Content-Length'] = response.headers['Content-Length']
+
+    async def stream():
+        try:
+            async for chunk in response.aiter_raw(1024 * 1024):
+                yield chunk
+        finally:
+            await response.aclose()
+            await client.aclose()
+
+    return StreamingResponse(stream(), media_type="video/mp4", headers=headers)
+
+# Voluntary per-host throttle on outbound calls: staying under the
+# threshold is much cheaper than eating 429s plus yt-dlp's retry backoff
+_limiters = {}
+
+def get_host_limiter(url):
+    host = urlparse(url).netloc
+    if host not in _limiters:
+        _limiters[host] = AsyncLimiter(max_rate=5, time_period=1)
+    return _limiters[host]
+
+# Single-flight layer: concurrent requests for the same URL share one
+# extraction instead of each hitting YouTube
+_inflight = {}
+
+async def extract_video_info_coalesced(url):
+    fut = _inflight.get(url)
+    if fut is None:
+        fut = asyncio.ensure_future(extract_video_info(url))
+        _inflight[url] = fut
+        fut.add_done_callback(lambda _: _inflight.pop(url, None))
+    return await fut
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -45,34 +190,183 @@ def format_filesize(size_bytes: Optional[int]) -> str:
         size_bytes /= 1024
     return f"{size_bytes:.1f} GB"
 
+# Use aria2c for the byte transfer when available: it splits each file
+# across parallel connections, which beats single-connection TCP on CDNs
+ARIA2C_AVAILABLE = shutil.which('aria2c') is not None
+
+# Scratch space for downloads and merges: prefer RAM-backed tmpfs so the
+# merge step runs at memory speed instead of hitting a physical disk.
+# Disable with YTDL_NO_TMPFS=1 on RAM-constrained hosts.
+TMPFS_DIR = ('/dev/shm'
+             if os.path.isdir('/dev/shm') and not os.environ.get('YTDL_NO_TMPFS')
+             else None)
+# Don't use tmpfs with less than this free — it is usually capped at half
+# of RAM, and a big video would hit ENOSPC where plain /tmp succeeds
+TMPFS_MIN_FREE = 2 * 1024 ** 3
+
+def make_temp_dir():
+    """Scratch dir on tmpfs when it has headroom, else the disk default."""
+    if TMPFS_DIR and shutil.disk_usage(TMPFS_DIR).free >= TMPFS_MIN_FREE:
+        return tempfile.mkdtemp(dir=TMPFS_DIR)
+    return tempfile.mkdtemp()
+
+# Runs of anything that isn't a word character or dash collapse to one
+# underscore; compiled once so sanitizing runs in C instead of per-char Python
+UNSAFE_CHARS = re.compile(r'[^\w\-]+')
+
+def sanitize_title(title):
+    """Filesystem-safe title, capped at 200 bytes of UTF-8.
+
+    The cap is on encoded bytes (cut on a codepoint boundary), not
+    characters: Linux limits filenames to 255 bytes and a 200-char CJK
+    title is ~600 bytes of UTF-8.
+    """
+    safe = UNSAFE_CHARS.sub('_', title)
+    safe = safe.encode('utf-8')[:200].decode('utf-8', 'ignore')
+    return safe.strip('_') or 'video'
+
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-us,en;q=0.5',
+}
+
 def get_ydl_opts(format_id=None):
     """Get YouTube-DL options with better format handling."""
     if format_id:
         # If specific format is requested, use it
         format_spec = format_id
     else:
-        # Otherwise use format specification that ensures we get both video and audio
-        format_spec = 'bv*+ba/b'  # Best video + best audio / fallback to best combined format
-        
-    return {
+        # Prefer a progressive MP4 (audio+video already in one file) so the
+        # common case skips the two-stream download and ffmpeg merge;
+        # fall back to best video + best audio / best combined
+        format_spec = 'b[ext=mp4][acodec!=none][vcodec!=none]/bv*+ba/b'
+
+    opts = {
         'format': format_spec,
         'format_sort': ['res', 'ext:mp4:m4a', 'size', 'br'],
+        # Parallel fragment downloads fill the pipe for DASH/HLS videos.
+        # Tunable via env var since some sites throttle parallel fetches.
+        'concurrent_fragment_downloads': int(os.environ.get('YTDL_CONCURRENT_FRAGS', 8)),
+        'http_chunk_size': 10485760,  # 10 MB
         'merge_output_format': 'mp4',  # Force merge into MP4
-        'postprocessors': [{
-            'key': 'FFmpegVideoConvertor',
-            'preferedformat': 'mp4',  # Ensure final format is MP4
-        }],
+        # The merger stream-copies by default; +faststart keeps the remux
+        # I/O-bound without touching the convertor, which still needs to
+        # transcode codecs that can't live in an MP4 container
+        'postprocessor_args': {
+            'merger': ['-movflags', '+faststart'],
+        },
         'quiet': False,
         'no_warnings': False,
         'extract_flat': False,
         'nocheckcertificate': True,
-        'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-us,en;q=0.5',
-        },
+        # Persist the signature/player cache across process restarts
+        'cachedir': os.path.expanduser('~/.cache/yt-dlp'),
+        'http_headers': HTTP_HEADERS,
     }
 
+    if not format_spec.startswith('b['):
+        # Only explicit/merged format selections need the MP4 convertor;
+        # a progressive MP4 is already in the right container
+        opts['postprocessors'] = [{
+            'key': 'FFmpegVideoConvertor',
+            'preferedformat': 'mp4',  # Ensure final format is MP4
+        }]
+
+    if ARIA2C_AVAILABLE:
+        opts['external_downloader'] = 'aria2c'
+        opts['external_downloader_args'] = {
+            'default': ['-x', '16', '-s', '16', '-k', '1M', '--min-split-size=1M'],
+        }
+
+    return opts
+
+def build_formats(info):
+    """Turn the extractor's format dicts into the sorted VideoFormat list."""
+    formats = []
+    # First collect complete formats (those with both video and audio)
+    complete_formats = [f for f in info['formats']
+                      if f.get('vcodec') != 'none' and f.get('acodec') != 'none']
+
+    # Then collect best video-only formats
+    video_formats = [f for f in info['formats']
+                   if f.get('vcodec') != 'none' and f.get('acodec') == 'none']
+
+    # Get the best audio format
+    audio_formats = [f for f in info['formats']
+                   if f.get('acodec') != 'none' and f.get('vcodec') == 'none']
+    best_audio = max(audio_formats, key=lambda x: x.get('filesize', 0)) if audio_formats else None
+
+    # Process complete formats
+    for f in complete_formats:
+        resolution = f.get('resolution', 'N/A')
+        height = f.get('height', 0)
+        width = f.get('width', 0)
+
+        if resolution == 'N/A' and height:
+            resolution = f"{width}x{height}"
+
+        quality_parts = []
+        if f.get('format_note'):
+            quality_parts.append(f.get('format_note'))
+        if f.get('fps'):
+            quality_parts.append(f"{f.get('fps')}fps")
+
+        quality = " - ".join(filter(None, quality_parts))
+
+        # model_construct skips validation — the fields come straight from
+        # yt-dlp, so there is nothing user-supplied to validate
+        format_info = VideoFormat.model_construct(
+            format_id=f['format_id'],
+            ext=f.get('ext', 'mp4'),
+            resolution=resolution,
+            filesize=f.get('filesize'),
+            note=f"{format_filesize(f.get('filesize'))} - {quality} (Complete)",
+            has_video=True,
+            has_audio=True,
+            quality=quality,
+            sort_height=f.get('height') or 0
+        )
+        formats.append(format_info)
+
+    # Process video formats that need to be merged with audio
+    if best_audio:
+        for f in video_formats:
+            resolution = f.get('resolution', 'N/A')
+            height = f.get('height', 0)
+            width = f.get('width', 0)
+
+            if resolution == 'N/A' and height:
+                resolution = f"{width}x{height}"
+
+            quality_parts = []
+            if f.get('format_note'):
+                quality_parts.append(f.get('format_note'))
+            if f.get('fps'):
+                quality_parts.append(f"{f.get('fps')}fps")
+
+            quality = " - ".join(filter(None, quality_parts))
+
+            # Calculate combined filesize
+            combined_size = (f.get('filesize', 0) or 0) + (best_audio.get('filesize', 0) or 0)
+
+            format_info = VideoFormat.model_construct(
+                format_id=f"{f['format_id']}+{best_audio['format_id']}",
+                ext='mp4',  # Will be merged to MP4
+                resolution=resolution,
+                filesize=combined_size,
+                note=f"{format_filesize(combined_size)} - {quality} (Merged)",
+                has_video=True,
+                has_audio=True,
+                quality=quality,
+                sort_height=f.get('height') or 0
+            )
+            formats.append(format_info)
+
+    # Sort by the height precomputed above — no string parsing per comparison
+    formats.sort(key=lambda x: (x.sort_height, x.filesize or 0), reverse=True)
+    return formats
+
 @app.get("/")
 async def read_root():
     return {"message": "YouTube Downloader API is running"}
@@ -80,174 +374,106 @@ async def read_root():
 @app.post("/formats")
 async def get_formats(video: VideoURL):
     try:
-        ydl_opts = get_ydl_opts()
-        
-        with YoutubeDL(ydl_opts) as ydl:
-            print(f"Extracting info for URL: {video.url}")
-            info = ydl.extract_info(video.url, download=False)
-            
-            formats = []
-            # First collect complete formats (those with both video and audio)
-            complete_formats = [f for f in info['formats'] 
-                              if f.get('vcodec') != 'none' and f.get('acodec') != 'none']
-            
-            # Then collect best video-only formats
-            video_formats = [f for f in info['formats'] 
-                           if f.get('vcodec') != 'none' and f.get('acodec') == 'none']
-            
-            # Get the best audio format
-            audio_formats = [f for f in info['formats'] 
-                           if f.get('acodec') != 'none' and f.get('vcodec') == 'none']
-            best_audio = max(audio_formats, key=lambda x: x.get('filesize', 0)) if audio_formats else None
-            
-            # Process complete formats
-            for f in complete_formats:
-                resolution = f.get('resolution', 'N/A')
-                height = f.get('height', 0)
-                width = f.get('width', 0)
-                
-                if resolution == 'N/A' and height:
-                    resolution = f"{width}x{height}"
-                
-                quality_parts = []
-                if f.get('format_note'):
-                    quality_parts.append(f.get('format_note'))
-                if f.get('fps'):
-                    quality_parts.append(f"{f.get('fps')}fps")
-                
-                quality = " - ".join(filter(None, quality_parts))
-                
-                format_info = VideoFormat(
-                    format_id=f['format_id'],
-                    ext=f.get('ext', 'mp4'),
-                    resolution=resolution,
-                    filesize=f.get('filesize'),
-                    note=f"{format_filesize(f.get('filesize'))} - {quality} (Complete)",
-                    has_video=True,
-                    has_audio=True,
-                    quality=quality
-                )
-                formats.append(format_info)
-            
-            # Process video formats that need to be merged with audio
-            if best_audio:
-                for f in video_formats:
-                    resolution = f.get('resolution', 'N/A')
-                    height = f.get('height', 0)
-                    width = f.get('width', 0)
-                    
-                    if resolution == 'N/A' and height:
-                        resolution = f"{width}x{height}"
-                    
-                    quality_parts = []
-                    if f.get('format_note'):
-                        quality_parts.append(f.get('format_note'))
-                    if f.get('fps'):
-                        quality_parts.append(f"{f.get('fps')}fps")
-                    
-                    quality = " - ".join(filter(None, quality_parts))
-                    
-                    # Calculate combined filesize
-                    combined_size = (f.get('filesize', 0) or 0) + (best_audio.get('filesize', 0) or 0)
-                    
-                    format_info = VideoFormat(
-                        format_id=f"{f['format_id']}+{best_audio['format_id']}",
-                        ext='mp4',  # Will be merged to MP4
-                        resolution=resolution,
-                        filesize=combined_size,
-                        note=f"{format_filesize(combined_size)} - {quality} (Merged)",
-                        has_video=True,
-                        has_audio=True,
-                        quality=quality
-                    )
-                    formats.append(format_info)
-            
-            # Sort formats by resolution and filesize
-            formats.sort(
-                key=lambda x: (
-                    int(x.resolution.split('x')[1]) if 'x' in x.resolution and x.resolution.split('x')[1].isdigit() else 0,
-                    x.filesize or 0
-                ),
-                reverse=True
-            )
-            
-            return {
+        print(f"Extracting info for URL: {video.url}")
+
+        info = await extract_video_info_coalesced(video.url)
+
+        def ndjson_stream():
+            # Header line first so the client can show title/duration
+            # while the format lines are still being serialized
+            yield json.dumps({
                 "title": info.get('title', 'Unknown Title'),
                 "duration": info.get('duration'),
-                "formats": formats
-            }
-            
+            }) + "\n"
+            for fmt in build_formats(info):
+                yield fmt.model_dump_json() + "\n"
+
+        return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
     except Exception as e:
         print(f"Error in get_formats: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/api/cache/clear")
+async def clear_cache():
+    """Drop cached metadata so the next request re-extracts fresh info."""
+    cache.clear()
+    return {"message": "Cache cleared"}
+
 @app.post("/download")
 async def download_video(video: VideoURL):
-    temp_dir = tempfile.mkdtemp()
+    # Fast path: /formats resolved this format's CDN URL moments ago, so a
+    # progressive (single-stream) download can be proxied directly without
+    # re-running the extractor or touching disk
+    if video.format_id and '+' not in video.format_id:
+        cached = cache.get(('format_url', video.url, video.format_id))
+        if cached:
+            response = await proxy_direct_url(video.url, cached)
+            if response is not None:
+                return response
+
+    temp_dir = make_temp_dir()
     try:
-        format_id = video.format_id or 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+        format_id = video.format_id or 'b[ext=mp4][acodec!=none][vcodec!=none]/bv*+ba/b'
         ydl_opts = get_ydl_opts(format_id)
         ydl_opts['outtmpl'] = os.path.join(temp_dir, '%(title)s.%(ext)s')
         
         print(f"Starting download with format {format_id}")
         
-        with YoutubeDL(ydl_opts) as ydl:
-            try:
-                print("Extracting video info...")
-                info = ydl.extract_info(video.url, download=True)
-                print("Download completed, preparing file...")
-                
-                title = info['title']
-                ext = info.get('ext', 'mp4')
-                
-                files = os.listdir(temp_dir)
-                if not files:
-                    raise Exception("Download failed: No file created")
-                
-                downloaded_file = os.path.join(temp_dir, files[0])
-                print(f"File found at: {downloaded_file}")
-                
-                if not os.path.exists(downloaded_file):
-                    raise Exception("File not found after download")
-                
-                file_size = os.path.getsize(downloaded_file)
-                if file_size == 0:
-                    raise Exception("Downloaded file is empty")
-                
-                print(f"File size: {format_filesize(file_size)}")
-                
-                safe_title = "".join(c if c.isalnum() or c in ['-', '_'] else '_' for c in title)
-                safe_filename = f"{safe_title}.{ext}"
-                
-                def cleanup():
-                    try:
-                        if os.path.exists(temp_dir):
-                            shutil.rmtree(temp_dir)
-                    except Exception as e:
-                        print(f"Cleanup error: {e}")
-
-                def file_iterator():
-                    try:
-                        with open(downloaded_file, 'rb') as f:
-                            while chunk := f.read(8192):
-                                yield chunk
-                    finally:
-                        cleanup()
-
-                print(f"Streaming file: {safe_filename}")
-                return StreamingResponse(
-                    file_iterator(),
-                    media_type="video/mp4",
-                    headers={
-                        "Content-Disposition": f'attachment; filename="{safe_filename}"',
-                        "Content-Length": str(file_size)
-                    }
-                )
-                
-            except Exception as e:
-                print(f"Download error: {str(e)}")
-                raise Exception(f"Download failed: {str(e)}")
-            
+        def do_download():
+            with YoutubeDL(ydl_opts) as ydl:
+                return ydl.extract_info(video.url, download=True)
+
+        try:
+            print("Extracting video info...")
+            loop = asyncio.get_running_loop()
+            async with get_host_limiter(video.url):
+                info = await loop.run_in_executor(executor, do_download)
+            print("Download completed, preparing file...")
+
+            title = info['title']
+            ext = info.get('ext', 'mp4')
+
+            files = os.listdir(temp_dir)
+            if not files:
+                raise Exception("Download failed: No file created")
+
+            downloaded_file = os.path.join(temp_dir, files[0])
+            print(f"File found at: {downloaded_file}")
+
+            if not os.path.exists(downloaded_file):
+                raise Exception("File not found after download")
+
+            file_size = os.path.getsize(downloaded_file)
+            if file_size == 0:
+                raise Exception("Downloaded file is empty")
+
+            print(f"File size: {format_filesize(file_size)}")
+
+            safe_title = sanitize_title(title)
+            safe_filename = f"{safe_title}.{ext}"
+
+            def cleanup():
+                try:
+                    if os.path.exists(temp_dir):
+                        shutil.rmtree(temp_dir)
+                except Exception as e:
+                    print(f"Cleanup error: {e}")
+
+            print(f"Streaming file: {safe_filename}")
+            # FileResponse uses sendfile(2), so the bytes go straight from
+            # the page cache to the socket without a Python copy loop
+            return FileResponse(
+                downloaded_file,
+                media_type="video/mp4",
+                filename=safe_filename,
+                background=BackgroundTask(cleanup)
+            )
+
+        except Exception as e:
+            print(f"Download error: {str(e)}")
+            raise Exception(f"Download failed: {str(e)}")
+
     except Exception as e:
         print(f"Error occurred: {str(e)}")
         if os.path.exists(temp_dir):
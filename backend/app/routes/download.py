@@ -1,7 +1,10 @@
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from app.util.youtube import download_video
 from pydantic import BaseModel
+import os
+import shutil
 
 router = APIRouter()
 
@@ -11,13 +14,14 @@ class DownloadRequest(BaseModel):
 @router.post("/api/download")
 async def download_youtube_video(request: DownloadRequest):
     try:
-        video_stream, filename = await download_video(request.url)
-        return StreamingResponse(
-            video_stream,
-            media_type="video/mp4",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
+        file_path, filename = await download_video(request.url)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cleanup = BackgroundTask(shutil.rmtree, os.path.dirname(file_path), ignore_errors=True)
+    return FileResponse(
+        file_path,
+        media_type="video/mp4",
+        filename=filename,
+        background=cleanup
+    )
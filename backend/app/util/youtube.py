@@ -1,24 +1,45 @@
 from yt_dlp import YoutubeDL
-from io import BytesIO
 import asyncio
+import os
+import re
+import shutil
+import tempfile
+
+# Runs of anything that isn't a word character or dash collapse to one underscore
+UNSAFE_CHARS = re.compile(r'[^\w\-]+')
 
 async def download_video(url: str):
+    """Download the video to a temp dir and return (file path, safe filename).
+
+    The caller is responsible for removing the temp dir once the file
+    has been served.
+    """
+    temp_dir = tempfile.mkdtemp()
     try:
-        buffer = BytesIO()
         ydl_opts = {
             'format': 'best',
-            'outtmpl': '-',
-            'logtostderr': True,
+            'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
         }
-        
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            title = info['title']
-            # Stream to memory instead of disk
-            ydl.download([url])
-            
-        buffer.seek(0)
-        safe_filename = f"{title}.mp4".replace(" ", "_")
-        return buffer, safe_filename
+
+        def fetch():
+            with YoutubeDL(ydl_opts) as ydl:
+                # Extract metadata and download in a single call
+                info = ydl.extract_info(url, download=True)
+                return info['title']
+
+        # Run the blocking yt-dlp work off the event loop
+        title = await asyncio.to_thread(fetch)
+
+        files = os.listdir(temp_dir)
+        if not files:
+            raise Exception("Download failed: No file created")
+
+        # Capped at 200 UTF-8 bytes (cut on a codepoint boundary) so the
+        # name stays under the kernel's 255-byte filename limit
+        safe_title = UNSAFE_CHARS.sub('_', title).encode('utf-8')[:200] \
+            .decode('utf-8', 'ignore').strip('_') or 'video'
+        safe_filename = f"{safe_title}.mp4"
+        return os.path.join(temp_dir, files[0]), safe_filename
     except Exception as e:
-        raise Exception(f"Download failed: {str(e)}")
\ No newline at end of file
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise Exception(f"Download failed: {str(e)}")
@@ -42,13 +42,44 @@ function App() {
         body: JSON.stringify({ url })
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error('Failed to get video information');
       }
 
-      const data = await response.json();
-      setVideoInfo(data);
-      setSelectedFormat(data.formats[0]?.format_id || '');
+      // /formats streams NDJSON: a header line with title/duration first,
+      // then one format per line — parse line-by-line and render as we go
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let info: VideoInfo | null = null;
+
+      const handleLine = (line: string) => {
+        if (!line.trim()) return;
+        const doc = JSON.parse(line);
+        if (!info) {
+          info = { title: doc.title, duration: doc.duration, formats: [] };
+        } else {
+          info.formats.push(doc as VideoFormat);
+        }
+        // Fresh objects so React re-renders while formats stream in
+        setVideoInfo({ ...info, formats: [...info.formats] });
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() ?? '';
+        lines.forEach(handleLine);
+      }
+      buffer += decoder.decode();
+      handleLine(buffer);
+
+      if (!info) {
+        throw new Error('Failed to get video information');
+      }
+      setSelectedFormat((info as VideoInfo).formats[0]?.format_id || '');
     } catch (err: any) {
       setError(err.message || 'Something went wrong');
     } finally {